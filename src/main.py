@@ -1,24 +1,64 @@
 import argparse
+import errno
+import os
+import re
+import sys
 import shutil
+import time
+import stat
 import calendar
+from array import array
 from pathlib import Path
 from categories import file_cats
-from datetime import datetime
-from collections import defaultdict
+from typing import Optional
+from functools import lru_cache, partial
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+folder_groups = {f"g{i}": folder for i, folder in enumerate(file_cats)}
+suffix_pattern = re.compile(
+    (
+        r".\.(?:"
+        + "|".join(
+            f"(?P<g{i}>{'|'.join(map(re.escape, suffixes))})"
+            for i, suffixes in enumerate(file_cats.values())
+        )
+        + r")\Z"
+    ).encode(),
+    re.IGNORECASE,
+)
+
+
+def check_empty(directory: bytes) -> bool:
+    with os.scandir(directory) as entries:
+        return all(entry.name == b".DS_Store" for entry in entries)
 
-def check_empty(source_path: Path) -> bool:
-    return all(item.name == ".DS_Store" for item in source_path.iterdir()) or not any(
-        source_path.iterdir()
-    )
 
+def remove_if_emptied(directory: bytes, child_counts: dict) -> None:
+    # Remove a directory once it has no children left, then walk up and
+    # remove every ancestor that the removal left empty.
+    while child_counts.get(directory) == 0 and check_empty(directory):
+        shutil.rmtree(directory)
+        del child_counts[directory]
+        directory = os.path.dirname(directory)
+        if directory in child_counts:
+            child_counts[directory] -= 1
 
-def delete_empty_dirs(source_path: Path) -> None:
-    directories = [d for d in source_path.rglob("*") if d.is_dir()]
-    directories.sort(key=lambda x: len(x.parts), reverse=True)
-    for item in directories:
-        if check_empty(item):
-            shutil.rmtree(item)
+
+def release_child(directory: bytes, child_counts: dict) -> None:
+    if directory in child_counts:
+        child_counts[directory] -= 1
+        remove_if_emptied(directory, child_counts)
+
+
+def prune_empty_dirs(child_counts: dict) -> None:
+    for directory in [d for d, count in child_counts.items() if count == 0]:
+        remove_if_emptied(directory, child_counts)
 
 
 def get_source_path(home_path: str, source_dir: str) -> Path:
@@ -45,6 +85,36 @@ def size_validator(file_size: float) -> str:
     return "large files"
 
 
+FICLONE = 0x40049409
+
+
+def fast_copy(source: str, destination: str) -> str:
+    # Anything but a regular file goes through shutil.copy2, which raises
+    # SpecialFileError for pipes instead of blocking on open().
+    if (
+        fcntl is None
+        or not sys.platform.startswith("linux")
+        or not stat.S_ISREG(os.stat(source).st_mode)
+    ):
+        return shutil.copy2(source, destination)
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        raise shutil.SameFileError(f"{source!r} and {destination!r} are the same file")
+
+    try:
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except OSError:
+                while os.copy_file_range(src.fileno(), dst.fileno(), 1 << 30):
+                    pass
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+            raise
+        return shutil.copy2(source, destination)
+    shutil.copystat(source, destination)
+    return destination
+
+
 def copy_dir_contents(source_dir: str, backup_dir: str) -> None:
     home_path = Path.home()
     source_path = home_path.joinpath(source_dir)
@@ -57,14 +127,27 @@ def copy_dir_contents(source_dir: str, backup_dir: str) -> None:
         backup_path.mkdir(exist_ok=True)
         print(f"Backup of {source_path} created successfully at {backup_path}")
 
-    for item in source_path.iterdir():
-        destination = backup_path / item.name
-        if item.resolve() == backup_path.resolve():
-            continue
-        elif item.is_dir():
-            shutil.copytree(item, destination, dirs_exist_ok=True)
-        else:
-            shutil.copy(item, destination)
+    resolved_backup = backup_path.resolve()
+
+    def ignore_backup(directory: str, names: list) -> set:
+        # Skip dangling symlinks here: copytree's own ignore_dangling_symlinks
+        # resolves relative link targets against the cwd and drops valid ones.
+        ignored = {
+            name
+            for name in names
+            if not os.path.exists(os.path.join(directory, name))
+        }
+        if Path(directory).resolve() == resolved_backup.parent:
+            ignored.update(name for name in names if name == resolved_backup.name)
+        return ignored
+
+    shutil.copytree(
+        source_path,
+        backup_path,
+        ignore=ignore_backup,
+        copy_function=fast_copy,
+        dirs_exist_ok=True,
+    )
 
 
 def backup_dir(source_dir: str, backup_dir: str) -> None:
@@ -77,55 +160,151 @@ def backup_dir(source_dir: str, backup_dir: str) -> None:
         print(f"Error backing up directory: {e}")
 
 
-def get_files(source_path: str, shallow: bool = False) -> list:
-    return source_path.glob("*") if shallow else source_path.rglob("*")
+def classify_dir(directory: bytes, classifier) -> tuple[list, list, Optional[int]]:
+    files = []
+    subdirs = []
+    child_count = 0
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name != b".DS_Store":
+                    child_count += 1
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    bucket = classifier(entry)
+                    if bucket is not None:
+                        files.append((bucket, entry))
+    except PermissionError:
+        # Skip unreadable directories like rglob does, and leave them out
+        # of child_counts so they are never pruned.
+        return [], [], None
+    return files, subdirs, child_count
+
+
+def skip_file(entry: os.DirEntry) -> None:
+    return None
+
+
+def get_files(
+    source_path: os.PathLike, classifier, child_counts: dict, shallow: bool = False
+):
+    # The walk stays in bytes paths to skip decoding every name.
+    # Directories below source_path record their child count in
+    # child_counts so emptied ones can be pruned with release_child().
+    files, subdirs, _ = classify_dir(os.fsencode(source_path), classifier)
+    yield from files
+    if shallow:
+        # Still walk the subdirectories so empty ones get pruned, but
+        # leave their files where they are.
+        classifier = skip_file
+
+    # Walk serially until enough subdirectories are queued, at any depth,
+    # to outweigh the cost of starting a thread pool.
+    while 0 < len(subdirs) < 4:
+        directory = subdirs.pop()
+        files, nested, child_count = classify_dir(directory, classifier)
+        if child_count is not None:
+            child_counts[directory] = child_count
+        yield from files
+        subdirs.extend(nested)
+    if not subdirs:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        pending = {executor.submit(classify_dir, d, classifier): d for d in subdirs}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory = pending.pop(future)
+                files, nested, child_count = future.result()
+                if child_count is not None:
+                    child_counts[directory] = child_count
+                pending.update(
+                    {executor.submit(classify_dir, d, classifier): d for d in nested}
+                )
+                yield from files
+
+
+@lru_cache(maxsize=None)
+def date_folder(year: int, month: int, year_only: bool = False) -> str:
+    if year_only:
+        return str(year)
+    return f"{calendar.month_name[month]}_{year}"
+
+
+def classify_file(
+    entry: os.DirEntry, method: str, year_only: bool = False
+) -> Optional[str]:
+    if method == "suffix":
+        match = suffix_pattern.search(entry.name)
+        return folder_groups[match.lastgroup] if match else None
+    elif method == "date":
+        creation_date = time.localtime(entry.stat().st_birthtime)
+        return date_folder(creation_date.tm_year, creation_date.tm_mon, year_only)
+    elif method == "size":
+        file_size_mb = compute_file_size_mb(entry)
+        return size_validator(file_size_mb)
+
+    print("Invalid method")
+    return None
 
 
 def organize_files(
     source_dir: str,
+    child_counts: dict,
     method: str = "suffix",
     shallow: bool = False,
     year_only: bool = False,
-) -> dict:
+):
     source_path = get_source_path(Path.home(), source_dir)
     if not verify_directory_exists(source_path):
         return None
 
-    files = get_files(source_path, shallow)
-    organized_files = defaultdict(list)
-    for item in files:
-        if item.is_file():
-            if method == "suffix":
-                file_suffix = item.suffix[1:].lower()
-                for folder, suffixes in file_cats.items():
-                    if file_suffix in suffixes:
-                        organized_files[folder].append(item)
-            elif method == "date":
-                creation_date = datetime.fromtimestamp(item.stat().st_birthtime)
-                if year_only:
-                    year = creation_date.year
-                    organized_files[str(year)].append(item)
-                else:
-                    year_month = f"{calendar.month_name[creation_date.month]}_{creation_date.year}"
-                    organized_files[year_month].append(item)
-            elif method == "size":
-                file_size_mb = compute_file_size_mb(item)
-                organized_files[size_validator(file_size_mb)].append(item)
+    classifier = partial(classify_file, method=method, year_only=year_only)
+    return get_files(source_path, classifier, child_counts, shallow)
 
-            else:
-                print("Invalid method")
-    return organized_files
+
+def move_file(source: bytes, destination: bytes) -> bool:
+    try:
+        os.rename(source, destination)
+    except FileNotFoundError:
+        # Only a source that vanished since the walk is skipped; a missing
+        # destination folder is a real error.
+        if os.path.lexists(source):
+            raise
+        return False
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(source, destination)
+    return True
 
 
-def move_files_to_dir(source_dir: str, files_dict: dict[list]) -> None:
+def move_files_to_dir(
+    source_dir: str,
+    method: str = "suffix",
+    shallow: bool = False,
+    year_only: bool = False,
+) -> None:
     source_path = get_source_path(Path.home(), source_dir)
-    for date, items in files_dict.items():
-        for item in items:
-            if item.is_file():
-                destination_folder = source_path / date
-                destination_folder.mkdir(exist_ok=True)
-                shutil.move(item, destination_folder / item.name)
-    delete_empty_dirs(source_path)
+    child_counts = {}
+    files = organize_files(source_dir, child_counts, method, shallow, year_only)
+    destination_folders = {}
+    for folder, entry in files:
+        destination_folder = destination_folders.get(folder)
+        if destination_folder is None:
+            destination_folder = source_path / folder
+            destination_folder.mkdir(exist_ok=True)
+            destination_folder = os.fsencode(destination_folder)
+            destination_folders[folder] = destination_folder
+        destination = os.path.join(destination_folder, entry.name)
+        if entry.path == destination:
+            continue
+        # .DS_Store files were never counted, so moving one frees nothing.
+        if move_file(entry.path, destination) and entry.name != b".DS_Store":
+            release_child(os.path.dirname(entry.path), child_counts)
+    prune_empty_dirs(child_counts)
 
 
 def print_memory_saved(memory_list: list) -> None:
@@ -143,25 +322,39 @@ def print_memory_saved(memory_list: list) -> None:
             )
 
 
-def time_validator(
-    creation_date: datetime.date,
+def expiry_cutoff(
     n_days: int = None,
     n_months: int = None,
     n_years: int = None,
-) -> bool:
-    now = datetime.now()
-    time_diff = now - creation_date
+) -> Optional[float]:
+    thresholds = []
     if n_days:
-        if time_diff.days >= n_days:
-            return True
+        thresholds.append(n_days)
     if n_months:
-        if (time_diff.days / 30) >= n_months:
-            return True
+        thresholds.append(n_months * 30)
     if n_years:
-        if (time_diff.days / 365) >= n_years:
-            return True
+        thresholds.append(n_years * 365)
+    if not thresholds:
+        return None
+
+    return time.time() - min(thresholds) * 86400
+
 
-    return False
+def classify_expired(entry: os.DirEntry, cutoff: float = None) -> Optional[str]:
+    if cutoff is not None and entry.stat().st_birthtime <= cutoff:
+        return "expired"
+    return None
+
+
+def delete_file(path: bytes) -> bool:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        print(f"Could not delete {os.fsdecode(path)}: {e}")
+        return False
+    return True
 
 
 def delete_files_by_time(
@@ -172,20 +365,26 @@ def delete_files_by_time(
     if not verify_directory_exists(source_path):
         return None
 
-    files = get_files(source_path)
-    memory_saved = []
-    for item in files:
-        if item.is_file():
-            creation_date = datetime.fromtimestamp(item.stat().st_birthtime)
-            file_size_mb = compute_file_size_mb(item)
-            if time_validator(creation_date, n_days, n_months, n_years):
-                item.unlink()
-                memory_saved.append(file_size_mb)
-            else:
-                continue
+    cutoff = expiry_cutoff(n_days, n_months, n_years)
+    classifier = partial(classify_expired, cutoff=cutoff)
+    child_counts = {}
+    files = get_files(source_path, classifier, child_counts)
+    expired = []
+    expired_sizes = array("d")
+    for _, entry in files:
+        expired.append(entry.path)
+        expired_sizes.append(compute_file_size_mb(entry))
+
+    memory_saved = array("d")
+    for path, file_size_mb in zip(expired, expired_sizes):
+        if delete_file(path):
+            memory_saved.append(file_size_mb)
+            directory, name = os.path.split(path)
+            if name != b".DS_Store":
+                release_child(directory, child_counts)
+    prune_empty_dirs(child_counts)
 
     print_memory_saved(memory_saved)
-    delete_empty_dirs(source_path)
 
 
 def confirm_cleaning(directory: str) -> bool:
@@ -278,15 +477,13 @@ def main():
             backup_dir(args.source_dir, args.backup_dir)
     if args.command == "clean":
         if confirm_cleaning(args.source_dir):
-            organized_files = organize_files(
+            move_files_to_dir(
                 source_dir=args.source_dir,
                 method=args.method,
                 shallow=args.shallow,
                 year_only=args.year_only,
             )
 
-            move_files_to_dir(args.source_dir, organized_files)
-
     elif args.command == "delete_files":
         if confirm_deletion(args.source_dir):
             if args.n_days:
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import main  # noqa: E402
+
+
+class DSStoreOnlyDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.TemporaryDirectory()
+        self.addCleanup(self.home.cleanup)
+        patcher = mock.patch.dict(os.environ, {"HOME": self.home.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.source = Path(self.home.name) / "t"
+        (self.source / "d1" / "d2").mkdir(parents=True)
+        (self.source / "d1" / ".DS_Store").touch()
+        (self.source / "d1" / "a.txt").touch()
+        (self.source / "d1" / "d2" / ".DS_Store").touch()
+
+    def test_size_clean_removes_emptied_directories(self):
+        main.move_files_to_dir("t", method="size")
+
+        self.assertEqual(sorted(os.listdir(self.source)), ["small_files"])
+
+    def test_delete_removes_emptied_directories(self):
+        with mock.patch.object(
+            main, "classify_expired", lambda entry, cutoff=None: "expired"
+        ):
+            main.delete_files_by_time("t", n_days=1)
+
+        self.assertEqual(os.listdir(self.source), [])
+
+
+if __name__ == "__main__":
+    unittest.main()